@@ -1,7 +1,7 @@
 """Business logic for STF agent execution."""
 
 import uuid
-import json
+import orjson
 import logging
 from typing import AsyncGenerator
 
@@ -18,6 +18,7 @@ from stf_agents.agents import (
     create_article_writing_agent,
     create_vision_agent,
 )
+from stf_agents.router import route
 from runner.stream import run_agent_stream
 from utils.create_config import create_stf_run_config
 from utils.sse import json_event
@@ -100,8 +101,16 @@ async def run_stf_agent_stream(
             vision_agent
         )
 
+        # Dispatch requests with an unambiguous article or media link straight to
+        # the specialist agent, skipping the manager's routing turn
+        request_route = route(request.user_message)
+        agent = {
+            "parse": article_parsing_agent,
+            "vision": vision_agent,
+        }.get(request_route, agent)
+
         logger.debug(
-            f"Agent created - session_id: {session_id}, model: {request.stf_model.model_name}"
+            f"Agent created - session_id: {session_id}, route: {request_route}, agent: {agent.name}"
         )
 
         initial_input: list[TResponseInputItem] = [
@@ -127,7 +136,7 @@ async def run_stf_agent_stream(
             event_queue=None,  # No queue - stream directly
         ):
             # Parse the JSON event from run_agent_stream
-            event_data = json.loads(event_json)
+            event_data = orjson.loads(event_json)
             event_type = event_data.get('type', 'unknown')
 
             # Include session_id in each event payload
@@ -3,6 +3,7 @@
 import os
 import logging
 from typing import Optional
+import asyncpg
 from pydantic import BaseModel
 from openai import AsyncOpenAI, DefaultAioHttpClient
 
@@ -10,6 +11,7 @@ from utils.embeddings import EmbeddingService
 from utils.sqlite_utils import ensure_db_folder_exists
 from utils.postgres_utils import initialize_postgres
 from utils.app_context import set_app_state_context
+from configs.database import ASYNCPG_DSN, PG_POOL_MAX_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +21,7 @@ class AppState(BaseModel):
 
     openai_client: AsyncOpenAI
     embedding_service: EmbeddingService
+    pg_pool: asyncpg.Pool
     port: int
 
     class Config:
@@ -68,10 +71,15 @@ class AppStateManager:
         await initialize_postgres()
         logger.info("PostgreSQL database initialized")
 
+        # Direct asyncpg pool for scalar queries that don't need the SQLAlchemy stack
+        pg_pool = await asyncpg.create_pool(ASYNCPG_DSN, min_size=1, max_size=PG_POOL_MAX_SIZE)
+        logger.info("asyncpg pool created")
+
         # Create app state
         self._state = AppState(
             openai_client=openai_client,
             embedding_service=embedding_service,
+            pg_pool=pg_pool,
             port=int(os.getenv("PORT", 8080)),
         )
 
@@ -89,5 +97,9 @@ class AppStateManager:
         await self._state.openai_client.close()
         logger.info("OpenAI client closed")
 
+        # Close asyncpg pool
+        await self._state.pg_pool.close()
+        logger.info("asyncpg pool closed")
+
         self._state = None
         logger.info("Application state shutdown complete")
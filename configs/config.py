@@ -36,3 +36,7 @@ CSV_HEADERS = [
 ]
 
 CSV_FILE_PATH = "data/sequence_data.csv"
+
+
+# Maximum article text passed to the LLM by fetch_article_content (tokens)
+ARTICLE_TEXT_TOKEN_BUDGET = 30000
@@ -1,4 +1,4 @@
-import json
+import orjson
 import logging
 import asyncio
 from typing import AsyncIterator, Optional
@@ -11,6 +11,18 @@ from pydantic import BaseModel
 logger = logging.getLogger(__name__)
 
 
+def _token_usage(result) -> dict:
+    """Aggregate token usage of a run, including prompt-cache hits."""
+    usage = result.context_wrapper.usage
+    input_details = getattr(usage, "input_tokens_details", None)
+    return {
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "cached_input_tokens": getattr(input_details, "cached_tokens", 0) or 0,
+        "output_tokens": usage.output_tokens,
+    }
+
+
 async def run_agent_stream(
     agent: Agent,
     initial_input: list[TResponseInputItem],
@@ -64,7 +76,7 @@ async def run_agent_stream(
                     if event_queue:
                         await event_queue.put(('reasoning_delta', event_data))
                     else:
-                        yield json.dumps(event_data)
+                        yield orjson.dumps(event_data).decode()
 
                 # Handle reasoning text deltas
                 elif (
@@ -78,7 +90,7 @@ async def run_agent_stream(
                     if event_queue:
                         await event_queue.put(('reasoning_delta', event_data))
                     else:
-                        yield json.dumps(event_data)
+                        yield orjson.dumps(event_data).decode()
 
             # Handle run items
             elif event.type == "run_item_stream_event":
@@ -130,7 +142,7 @@ async def run_agent_stream(
                     if event_queue:
                         await event_queue.put(('tool_call', event_data))
                     else:
-                        yield json.dumps(event_data)
+                        yield orjson.dumps(event_data).decode()
 
                 elif event.item.type == "tool_call_output_item":
                     output = event.item.output
@@ -148,7 +160,7 @@ async def run_agent_stream(
                     if event_queue:
                         await event_queue.put(('tool_output', event_data))
                     else:
-                        yield json.dumps(event_data)
+                        yield orjson.dumps(event_data).decode()
 
         # Agent completed - final_output is the response
         logger.info(
@@ -156,6 +168,14 @@ async def run_agent_stream(
             session_id, tool_call_count
         )
 
+        # Prompt-cache hit ratio drops when the static instruction prefix drifts
+        token_usage = _token_usage(result)
+        logger.info(
+            "Token usage - session_id: %s, requests: %d, input_tokens: %d, cached_input_tokens: %d, output_tokens: %d",
+            session_id, token_usage["requests"], token_usage["input_tokens"],
+            token_usage["cached_input_tokens"], token_usage["output_tokens"]
+        )
+
         # Extract final output from agent
         #final_output_text = str(result.final_output) if result.final_output else ""
         final_obj = result.final_output
@@ -179,16 +199,17 @@ async def run_agent_stream(
         if event_queue:
             await event_queue.put(('final_response', event_data))
         else:
-            yield json.dumps(event_data)
+            yield orjson.dumps(event_data).decode()
 
         event_data = {
             'type': 'completed',
             'tool_calls': tool_call_count,
+            'token_usage': token_usage,
         }
         if event_queue:
             await event_queue.put(('completed', event_data))
         else:
-            yield json.dumps(event_data)
+            yield orjson.dumps(event_data).decode()
 
     except Exception as e:
         logger.error(
@@ -7,9 +7,12 @@ from stf_agents.base import BaseSTFAgent
 from stf_agents.schemas import ParsingOutput
 from tools.stf_tools import (
     fetch_article_content,
+    fetch_article_contents,
     web_search_tool,
     get_uniprot_id,
+    get_uniprot_ids,
     save_to_database,
+    save_genes_to_database,
 )
 
 
@@ -34,12 +37,16 @@ class ArticleParsingAgent(BaseSTFAgent):
         super().__init__(
             name="Article Parsing Agent",
             instructions=prompts.ARTICLE_PARSING_INSTRUCTIONS,
+            instructions_tokens=prompts.instructions_token_count(prompts.ARTICLE_PARSING_INSTRUCTIONS),
             run_config=run_config,
             tools=[
                 fetch_article_content,
+                fetch_article_contents,
                 web_search_tool,
                 get_uniprot_id,
+                get_uniprot_ids,
                 save_to_database,
+                save_genes_to_database,
             ],
             handoff_description="Analyze research articles to extract longevity-related genes and sequence-function relationships.",
             output_type=ParsingOutput,
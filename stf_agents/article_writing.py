@@ -28,6 +28,7 @@ class ArticleWritingAgent(BaseSTFAgent):
         super().__init__(
             name="Article Writing Agent",
             instructions=prompts.ARTICLE_WRITING_INSTRUCTIONS,
+            instructions_tokens=prompts.instructions_token_count(prompts.ARTICLE_WRITING_INSTRUCTIONS),
             run_config=run_config,
             tools=[semantic_search],
             handoff_description="Generate research articles, summaries, and reports based on sequence-function data stored in the database. Create scientific content about longevity genes and pathways.",
@@ -1,8 +1,16 @@
 """Base agent class for STF agents."""
 
-from agents import Agent, RunConfig
+from agents import Agent, ModelSettings, RunConfig
 from typing import Optional
 
+# Providers only cache prompt prefixes of at least this many tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def prompt_cache_key(name: str) -> str:
+    """Stable per-agent key so requests sharing the same instructions hit the same prompt cache."""
+    return "stf-" + "-".join(name.lower().split())
+
 
 class BaseSTFAgent(Agent):
     """
@@ -20,6 +28,7 @@ class BaseSTFAgent(Agent):
         handoffs: list = None,
         handoff_description: Optional[str] = None,
         output_type: Optional[type] = None,
+        instructions_tokens: Optional[int] = None,
     ):
         """
         Initialize a base STF agent.
@@ -32,6 +41,7 @@ class BaseSTFAgent(Agent):
             handoffs: List of agents this agent can handoff to
             handoff_description: Description for handoff capability
             output_type: Expected output type/schema
+            instructions_tokens: Precomputed token count of the instructions
         """
         agent_kwargs = {
             "name": name,
@@ -48,7 +58,13 @@ class BaseSTFAgent(Agent):
         if output_type:
             agent_kwargs["output_type"] = output_type
 
-        if run_config.model_settings is not None:
-            agent_kwargs["model_settings"] = run_config.model_settings
+        # Static instructions only change on deploy: route every call of this agent
+        # to the same provider-side prompt cache, if they are long enough to be cached
+        model_settings = run_config.model_settings or ModelSettings()
+        if instructions_tokens is None or instructions_tokens >= PROMPT_CACHE_MIN_TOKENS:
+            model_settings = model_settings.resolve(
+                ModelSettings(extra_args={"prompt_cache_key": prompt_cache_key(name)})
+            )
+        agent_kwargs["model_settings"] = model_settings
 
         super().__init__(**agent_kwargs)
@@ -27,6 +27,7 @@ class DataRetrievalAgent(BaseSTFAgent):
         super().__init__(
             name="Data Retrieval Agent",
             instructions=prompts.DATA_RETRIEVAL_INSTRUCTIONS,
+            instructions_tokens=prompts.instructions_token_count(prompts.DATA_RETRIEVAL_INSTRUCTIONS),
             run_config=run_config,
             tools=[
                 execute_sql_query,
@@ -38,6 +38,7 @@ class STFManagerAgent(BaseSTFAgent):
         super().__init__(
             name="Sequence To Function Manager",
             instructions=prompts.MANAGER_INSTRUCTIONS,
+            instructions_tokens=prompts.instructions_token_count(prompts.MANAGER_INSTRUCTIONS),
             run_config=run_config,
             tools=[],
             handoffs=[
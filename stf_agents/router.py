@@ -0,0 +1,33 @@
+"""Local intent routing for STF requests.
+
+Requests carrying an unambiguous link (a media file or a PMC/PubMed/DOI article)
+are dispatched straight to the specialist agent, saving the manager's LLM turn.
+Everything else falls through to the manager: specialists have no handoffs, so
+questions and multi-step requests ("find ... and write ...") need its coordination.
+"""
+
+import re
+from typing import Literal
+
+Route = Literal["parse", "vision", "llm"]
+
+_MEDIA_URL_RE = re.compile(r"https?://\S+\.(?:pdf|png|jpe?g|gif|webp|tiff?)\b", re.IGNORECASE)
+_ARTICLE_URL_RE = re.compile(r"https?://\S*(?:pmc|pubmed|doi)", re.IGNORECASE)
+
+
+def route(user_msg: str) -> Route:
+    """
+    Classify a user message without calling the LLM.
+
+    Args:
+        user_msg: Raw user message
+
+    Returns:
+        Target agent route, or "llm" if the manager has to decide
+    """
+    msg = user_msg.strip()
+    if _MEDIA_URL_RE.search(msg):
+        return "vision"
+    if _ARTICLE_URL_RE.search(msg):
+        return "parse"
+    return "llm"
@@ -1,13 +1,24 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import weakref
+from pydantic import BaseModel, ConfigDict, TypeAdapter, field_validator
+from typing import List, Optional, Tuple
 
 class Citation(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     title: str
-    authors: List[str] = []
+    authors: Tuple[str, ...] = ()
     year: Optional[int] = None
     doi: Optional[str] = None
     url: Optional[str] = None
 
+# Papers share reference lists: keep one live instance per distinct citation
+_CITATION_POOL: "weakref.WeakValueDictionary[tuple, Citation]" = weakref.WeakValueDictionary()
+
+def intern_citation(citation: Citation) -> Citation:
+    """Return the shared instance for citations equal to this one."""
+    key = (citation.title, citation.authors, citation.year, citation.doi, citation.url)
+    return _CITATION_POOL.setdefault(key, citation)
+
 class ParsingGene(BaseModel):
     gene: str
     protein_uniprot_id: str
@@ -20,6 +31,11 @@ class ParsingGene(BaseModel):
     citations: List[Citation] = []
     article_url: str
 
+    @field_validator("citations", mode="after")
+    @classmethod
+    def _intern_citations(cls, citations: List[Citation]) -> List[Citation]:
+        return [intern_citation(citation) for citation in citations]
+
 class ParsingOutput(BaseModel):
     summary: str # answer to the question in accordance with the information found/brief description of the article
     genes: List[ParsingGene] = []
@@ -36,4 +52,6 @@ class MediaNote(BaseModel):
     kind: str   # "image" | "pdf"
     description: str       # summary or caption
     relevance: bool = True
-    relevance_score: float = 1.0
\ No newline at end of file
+    relevance_score: float = 1.0
+
+MEDIA_NOTES_ADAPTER = TypeAdapter(list[MediaNote])
\ No newline at end of file
@@ -28,6 +28,7 @@ class VisionAgent(BaseSTFAgent):
         super().__init__(
             name="Vision Analysis Agent",
             instructions=prompts.VISION_AGENT_INSTRUCTIONS,
+            instructions_tokens=prompts.instructions_token_count(prompts.VISION_AGENT_INSTRUCTIONS),
             run_config=run_config,
             tools=[vision_media],
             handoff_description="Analyze images and PDF documents from URLs to extract sequence-function data",
@@ -2,13 +2,169 @@
 Testing endpoints router for sequence-to-function service
 """
 
-from typing import Callable
-from fastapi import APIRouter, Depends
-from sqlalchemy import text
-from configs.database import get_db
+import os
+import time
+import secrets
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional, Sequence
+import asyncpg
+import orjson
+import sqlparse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import Row, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from configs.database import AsyncSessionLocal, get_db
 from app_startup.state import AppState
 from configs.endpoints_base_models import SQLQueryRequest
 
+# Constant statements, built once and reused across requests (the COUNT runs on raw asyncpg)
+_COUNT_SQL = "SELECT COUNT(*) FROM sequence_data"
+# Planner's row estimate: a catalog lookup instead of a scan (-1 until first VACUUM/ANALYZE)
+_ESTIMATE_COUNT_SQL = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass('sequence_data')"
+_DROP_SQL = text("DROP TABLE IF EXISTS sequence_data CASCADE")
+
+_DROP_SUCCESS = {
+    "status": "success",
+    "message": "sequence_data table deleted successfully"
+}
+
+# Seconds a sequence-data-count result is served from memory
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 2))
+
+# Token required in X-Admin-Token to drop the table; the endpoint is disabled while unset
+TESTING_ADMIN_TOKEN = os.getenv("TESTING_ADMIN_TOKEN")
+
+
+def _is_admin(token: Optional[str]) -> bool:
+    """Constant-time check of a request's admin token against TESTING_ADMIN_TOKEN."""
+    if not TESTING_ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token.encode(), TESTING_ADMIN_TOKEN.encode())
+
+
+async def _fetch_sequence_data_count(pg_pool: asyncpg.Pool) -> int:
+    """Run the COUNT straight on the asyncpg pool, independent of any single request."""
+    return await pg_pool.fetchval(_COUNT_SQL)
+
+
+async def _estimate_sequence_data_count(pg_pool: asyncpg.Pool) -> Optional[int]:
+    """Return the planner's row estimate, or None if the table is missing or never analyzed."""
+    estimate = await pg_pool.fetchval(_ESTIMATE_COUNT_SQL)
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
+
+
+def _build_rows_body(query: str, columns: List[str], rows: Sequence[Row]) -> bytes:
+    """
+    Build the execute-sql JSON body for a row-returning query.
+
+    Rows are zipped against a key tuple (one C-level zip per row, no RowMapping
+    objects) and encoded with orjson directly, skipping jsonable_encoder.
+    """
+    keys = tuple(columns)
+    data = [dict(zip(keys, row)) for row in rows]
+    return orjson.dumps({
+        "status": "success",
+        "query": query,
+        "columns": columns,
+        "data": data,
+        "row_count": len(data)
+    }, default=str)
+
+
+# Statement types execute-sql runs; DDL, DO blocks, VACUUM, COMMENT and the rest are rejected
+_ALLOWED_STATEMENT_TYPES = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+
+def _parse_statements(query: str) -> List[sqlparse.sql.Statement]:
+    """Parse a query into its sqlparse statements, ignoring comments and empty fragments."""
+    return [
+        stmt for stmt in sqlparse.parse(sqlparse.format(query, strip_comments=True))
+        if str(stmt).strip(" \t\r\n;")
+    ]
+
+
+def _is_blocked_query(query: str) -> bool:
+    """
+    True if any statement is not a SELECT, INSERT, UPDATE or DELETE (WITH ... forms
+    included). An allowlist rather than a keyword blocklist, so DO $$ ... EXECUTE ... $$
+    and other statement types can't slip a schema change through execute-sql.
+    """
+    return any(stmt.get_type() not in _ALLOWED_STATEMENT_TYPES for stmt in _parse_statements(query))
+
+
+def _blocked_query_error(query: str) -> dict:
+    """Error payload for a query rejected by _is_blocked_query."""
+    return {
+        "status": "error",
+        "query": query,
+        "message": "Only SELECT, INSERT, UPDATE and DELETE statements are allowed on this endpoint"
+    }
+
+
+async def _execute_sql_script(pg_pool: asyncpg.Pool, script: str) -> None:
+    """
+    Run a multi-statement script in one transaction and one round trip.
+
+    Without arguments asyncpg sends the script over the simple query protocol, so
+    every statement reaches the server at once; any failure rolls them all back.
+    """
+    async with pg_pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(script)
+
+
+# Rows per NDJSON line in /execute-sql/stream
+STREAM_PARTITION_SIZE = 1000
+
+
+async def _stream_sql_query(query: str, on_commit: Callable[[], None]) -> AsyncIterator[bytes]:
+    """
+    Run a query and yield NDJSON lines: a header line with the column names, then
+    lists of row arrays (one partition per line).
+
+    SELECTs run on a server-side cursor and rows are sent as they arrive. A cursor only
+    binds a statement without result rows and never runs it, so any other statement is
+    executed directly and committed, then on_commit runs before the header is sent.
+    The session is opened here rather than injected, since it has to stay open for as
+    long as the response body is being sent.
+    """
+    statements = _parse_statements(query)
+    is_select = len(statements) == 1 and statements[0].get_type() == "SELECT"
+    try:
+        async with AsyncSessionLocal() as db_session:
+            if not is_select:
+                result = await db_session.execute(text(query))
+                columns = list(result.keys()) if result.returns_rows else []
+                rows = result.fetchall() if result.returns_rows else []
+                await db_session.commit()
+                on_commit()
+                yield orjson.dumps({
+                    "status": "success",
+                    "query": query,
+                    "columns": columns,
+                    "affected_rows": result.rowcount
+                }) + b"\n"
+                for start in range(0, len(rows), STREAM_PARTITION_SIZE):
+                    partition = rows[start:start + STREAM_PARTITION_SIZE]
+                    yield orjson.dumps([tuple(row) for row in partition], default=str) + b"\n"
+                return
+
+            result = await db_session.stream(text(query))
+            columns = list(result.keys())
+            yield orjson.dumps({"status": "success", "query": query, "columns": columns}) + b"\n"
+            async for partition in result.partitions(STREAM_PARTITION_SIZE):
+                yield orjson.dumps([tuple(row) for row in partition], default=str) + b"\n"
+    except SQLAlchemyError as e:
+        yield orjson.dumps({
+            "status": "error",
+            "query": query,
+            "message": f"Failed to execute query: {str(e)}"
+        }) + b"\n"
+
 
 def get_testing_router(app_state_getter: Callable[[], AppState]) -> APIRouter:
     """
@@ -22,107 +178,223 @@ def get_testing_router(app_state_getter: Callable[[], AppState]) -> APIRouter:
     """
     router = APIRouter(prefix="/testing", tags=["testing"])
 
+    # COUNT in flight; concurrent requests await it instead of starting their own scan
+    count_task: Optional[asyncio.Task] = None
+    # Last successful COUNT, reused until it expires
+    count_cache = {"value": None, "expires": 0.0}
+
+    def _finish_count_task(task: asyncio.Task) -> None:
+        nonlocal count_task
+        # A task detached by _invalidate_count is stale; don't cache its result
+        if count_task is not task:
+            return
+        count_task = None
+        if not task.cancelled() and task.exception() is None:
+            count_cache["value"] = task.result()
+            count_cache["expires"] = time.monotonic() + COUNT_CACHE_TTL
+
+    def _invalidate_count() -> None:
+        """Forget the cached and in-flight COUNT after a write to the table."""
+        nonlocal count_task
+        count_task = None
+        count_cache["expires"] = 0.0
+
     @router.get("/sequence-data-count")
-    async def get_sequence_data_count(app_state: AppState = Depends(app_state_getter)):
+    async def get_sequence_data_count(
+        estimate: bool = Query(False),
+        app_state: AppState = Depends(app_state_getter),
+    ):
         """
         Get total number of rows in sequence_data table
         
+        Args:
+            estimate: Return the planner's row estimate instead of running COUNT(*)
+            
         Returns:
             Total record count
         """
-        try:            
-            async for db_session in get_db():
-                result = await db_session.execute(text("SELECT COUNT(*) FROM sequence_data"))
-                total_count = result.scalar()
-                
+        nonlocal count_task
+        if estimate:
+            try:
+                estimated_count = await _estimate_sequence_data_count(app_state.pg_pool)
+            except (asyncpg.PostgresError, OSError) as e:
+                return {
+                    "status": "error",
+                    "message": f"Failed to get record count: {str(e)}"
+                }
+            if estimated_count is not None:
                 return {
                     "status": "success",
-                    "total_records": total_count
+                    "total_records": estimated_count,
+                    "estimated": True
                 }
+
+        if time.monotonic() < count_cache["expires"]:
+            return {
+                "status": "success",
+                "total_records": count_cache["value"]
+            }
+
+        if count_task is None:
+            count_task = asyncio.create_task(_fetch_sequence_data_count(app_state.pg_pool))
+            count_task.add_done_callback(_finish_count_task)
+
+        try:
+            # Shielded so a disconnecting client doesn't cancel the query for the others
+            total_count = await asyncio.shield(count_task)
+                
+            return {
+                "status": "success",
+                "total_records": total_count
+            }
                 
-        except Exception as e:
+        except (asyncpg.PostgresError, OSError) as e:
             return {
                 "status": "error",
                 "message": f"Failed to get record count: {str(e)}"
             }
 
-    @router.get("/delete-sequence-data-table")
-    async def delete_sequence_data_table(app_state: AppState = Depends(app_state_getter)):
+    # Serializes DROPs; callers that queued behind a finished DROP reuse its result
+    drop_lock = asyncio.Lock()
+    drop_generation = 0
+
+    @router.delete("/delete-sequence-data-table")
+    async def delete_sequence_data_table(
+        x_admin_token: Optional[str] = Header(None),
+        db_session: AsyncSession = Depends(get_db),
+        app_state: AppState = Depends(app_state_getter),
+    ):
         """
         Delete the sequence_data table
         
+        Args:
+            x_admin_token: Admin token from the X-Admin-Token header (must match TESTING_ADMIN_TOKEN)
+            
         Returns:
             Result of table deletion
         """
-        try:            
-            async for db_session in get_db():
-                await db_session.execute(text("DROP TABLE IF EXISTS sequence_data CASCADE"))
+        nonlocal drop_generation
+        # Checked before drop_lock, so unauthorized calls never queue behind a DROP
+        if not _is_admin(x_admin_token):
+            raise HTTPException(status_code=403, detail="Admin token required to delete the table")
+
+        generation = drop_generation
+        try:
+            async with drop_lock:
+                if drop_generation != generation:
+                    return _DROP_SUCCESS
+                await db_session.execute(_DROP_SQL)
                 await db_session.commit()
+                drop_generation += 1
+                _invalidate_count()
                 
-                return {
-                    "status": "success",
-                    "message": "sequence_data table deleted successfully"
-                }
+            return _DROP_SUCCESS
                 
-        except Exception as e:
+        except SQLAlchemyError as e:
+            # Return the connection to the pool clean, not in an aborted transaction
+            await db_session.rollback()
             return {
                 "status": "error",
                 "message": f"Failed to delete table: {str(e)}"
             }
 
     @router.post("/execute-sql")
-    async def execute_sql_query(request: SQLQueryRequest, app_state: AppState = Depends(app_state_getter)):
+    async def execute_sql_query(
+        request: SQLQueryRequest,
+        count_only: bool = Query(False),
+        db_session: AsyncSession = Depends(get_db),
+        app_state: AppState = Depends(app_state_getter),
+    ):
         """
         Execute a provided SQL query in the database
         
         Args:
             request: SQLQueryRequest containing the SQL query to execute
+            count_only: For SELECT queries, return only the number of rows
             
         Returns:
             Result of SQL query execution
         """
+        if _is_blocked_query(request.query):
+            return _blocked_query_error(request.query)
+
+        # Prepared statements take one command, so scripts go to asyncpg as a single batch.
+        # Comment-only fragments (e.g. a trailing "-- note" line) don't count as statements
+        statements = _parse_statements(request.query)
+        statement_count = len(statements)
+        if statement_count > 1:
+            try:
+                await _execute_sql_script(app_state.pg_pool, request.query)
+            except (asyncpg.PostgresError, OSError) as e:
+                return {
+                    "status": "error",
+                    "query": request.query,
+                    "message": f"Failed to execute script: {str(e)}"
+                }
+            _invalidate_count()
+            return {
+                "status": "success",
+                "query": request.query,
+                "statement_count": statement_count,
+                "message": f"Script executed successfully. {statement_count} statements committed."
+            }
+
         try:
-            async for db_session in get_db():
-                result = await db_session.execute(text(request.query))
+            if count_only and statement_count == 1 and statements[0].get_type() == "SELECT":
+                # Counted on the server; no rows are fetched
+                inner = sqlparse.format(request.query, strip_comments=True).strip().rstrip(";")
+                result = await db_session.execute(text(f"SELECT COUNT(*) FROM ({inner}) AS q"))
+                return {
+                    "status": "success",
+                    "query": request.query,
+                    "row_count": result.scalar()
+                }
+
+            result = await db_session.execute(text(request.query))
                 
-                # Handle different types of queries
-                if result.returns_rows:
-                    # SELECT queries - fetch results
-                    rows = result.fetchall()
-                    columns = list(result.keys()) if rows else []
-                    
-                    # Convert rows to list of dictionaries
-                    data = []
-                    for row in rows:
-                        row_dict = {}
-                        for i, column in enumerate(columns):
-                            row_dict[column] = row[i]
-                        data.append(row_dict)
-                    
-                    return {
-                        "status": "success",
-                        "query": request.query,
-                        "columns": columns,
-                        "data": data,
-                        "row_count": len(data)
-                    }
-                else:
-                    # INSERT, UPDATE, DELETE, etc. - commit changes
-                    await db_session.commit()
-                    affected_rows = result.rowcount
+            # Handle different types of queries
+            if result.returns_rows:
+                # SELECT queries - fetch results
+                rows = result.fetchall()
+                columns = list(result.keys()) if rows else []
+                # Row assembly and encoding are pure CPU; keep them off the event loop
+                body = await asyncio.to_thread(_build_rows_body, request.query, columns, rows)
+                return Response(content=body, media_type="application/json")
+            else:
+                # INSERT, UPDATE, DELETE, etc. - commit changes
+                await db_session.commit()
+                _invalidate_count()
+                affected_rows = result.rowcount
                     
-                    return {
-                        "status": "success",
-                        "query": request.query,
-                        "affected_rows": affected_rows,
-                        "message": f"Query executed successfully. {affected_rows} rows affected."
-                    }
+                return {
+                    "status": "success",
+                    "query": request.query,
+                    "affected_rows": affected_rows,
+                    "message": f"Query executed successfully. {affected_rows} rows affected."
+                }
                     
-        except Exception as e:
+        except SQLAlchemyError as e:
+            # Return the connection to the pool clean, not in an aborted transaction
+            await db_session.rollback()
             return {
                 "status": "error",
                 "query": request.query,
                 "message": f"Failed to execute query: {str(e)}"
             }
 
+    @router.post("/execute-sql/stream")
+    async def execute_sql_query_stream(request: SQLQueryRequest, app_state: AppState = Depends(app_state_getter)):
+        """
+        Execute a provided SQL query and stream the result as NDJSON
+        
+        Args:
+            request: SQLQueryRequest containing the SQL query to execute
+            
+        Returns:
+            Streaming response: a header line with columns, then row arrays in partitions
+        """
+        if _is_blocked_query(request.query):
+            return _blocked_query_error(request.query)
+        return StreamingResponse(_stream_sql_query(request.query, _invalidate_count), media_type="application/x-ndjson")
+
     return router
\ No newline at end of file
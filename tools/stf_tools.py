@@ -1,21 +1,40 @@
 import os
 import re
-import json
-import base64
+import asyncio
+import hashlib
+import itertools
+import time
 import logging
+import threading
+import orjson
+import pybase64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
+from io import BytesIO
 from typing import List, Optional, Tuple
 import requests
-import urllib
-from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urlparse, urlunparse, urlencode, parse_qs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from cssselect import HTMLTranslator
+from PIL import Image
 from openai import OpenAI
 from agents import function_tool, WebSearchTool
-from sqlalchemy import text
+from sqlalchemy import Float, Integer, String, bindparam, text
 import mygene
+import sqlparse
+from configs.config import ARTICLE_TEXT_TOKEN_BUDGET
 from configs.database import get_db
 from utils.database_service import DatabaseService
 from utils.app_context import get_embedding_service
-from stf_agents.schemas import ArticleContext, MediaNote
+from utils.text_chunking import select_relevant_chunks
+from utils.uniprot_cache import get_cached_uniprot_id, cache_uniprot_id
+from stf_agents.schemas import ArticleContext, MediaNote, ParsingGene, MEDIA_NOTES_ADAPTER
 
 from dotenv import load_dotenv
 
@@ -27,9 +46,168 @@ logger = logging.getLogger(__name__)
 
 web_search_tool = WebSearchTool(search_context_size="high")
 
+_WS_RE = re.compile(r"\s+")
+
+# Common article containers, tried in priority order
+_CONTENT_SELECTORS = (
+    "article",
+    ".article-body",
+    ".content",
+    ".main-content",
+    "#content",
+    ".abstract",
+    ".full-text",
+)
+# Compiled to XPath once: the grouped selector finds every candidate in a single tree walk,
+# the per-selector self:: tests rank the candidates by priority
+_CONTENT_XPATH = CSSSelector(", ".join(_CONTENT_SELECTORS), translator="html")
+_CONTENT_RANKS = tuple(
+    etree.XPath(f"boolean({HTMLTranslator().css_to_xpath(selector, prefix='self::')})")
+    for selector in _CONTENT_SELECTORS
+)
+# Charset from the Content-Type header or a <meta> tag near the top of the page
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+# (connect, read) timeouts: fail fast on unreachable hosts, allow slow article pages
+ARTICLE_FETCH_TIMEOUT = (5, 30)
+# Article HTML beyond this is not downloaded; the text is trimmed to a token budget anyway
+ARTICLE_MAX_BYTES = 8 * 1024 * 1024
+
+# PDFs larger than this are skipped by vision_media instead of being downloaded in full
+PDF_MAX_BYTES = 50 * 1024 * 1024
+
+# Parsed articles are reused for an hour; agents re-fetch the same URL across steps
+ARTICLE_CACHE_SIZE = 256
+ARTICLE_CACHE_TTL = 3600
+_article_cache: OrderedDict[str, Tuple[float, ArticleContext]] = OrderedDict()
+_article_cache_lock = threading.Lock()
+
+# Parallel image/PDF downloads in vision_media
+MEDIA_DOWNLOAD_WORKERS = 16
+
+# Media items per vision request, and vision requests in flight per vision_media call
+VISION_ITEMS_PER_CALL = 4
+VISION_CONCURRENCY = 4
+
+# Request headers, built once
+_ARTICLE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+    "DNT": "1",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-User": "?1",
+    "Cache-Control": "max-age=0",
+}
+
+_ARTICLE_FALLBACK_HEADERS = {
+    **_ARTICLE_HEADERS,
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0",
+}
+
+_IMAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": "https://www.google.com/",
+}
+
+_PDF_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Accept": "application/pdf,application/octet-stream;q=0.9,*/*;q=0.8",
+}
+
+
+# Article <img> filtering: extensions that are usually logos/icons, and hints in URL/alt/class/id
+_IMAGE_BAD_EXT = (".svg", ".ico", ".gif")
+_IMAGE_GOOD_HINTS_RE = re.compile(r"figure|fig|graph|plot|gel|western|microscop|blot|supp|supplement")
+_IMAGE_BAD_HINTS_RE = re.compile(
+    r"logo|icon|avatar|sprite|banner|ad|advert|cookie|gdpr|social|share|header|footer|nav"
+)
+
+
+def _is_relevant_image(img_tag, abs_url: str) -> bool:
+    """Guess whether an article <img> is a figure worth sending to vision analysis."""
+    u = abs_url.lower()
+    if u.endswith(_IMAGE_BAD_EXT):
+        return False
+    alt = (img_tag.get("alt") or "").lower()
+    cls = (img_tag.get("class") or "").lower()
+    _id = (img_tag.get("id") or "").lower()
+    # Fields joined with a separator no hint contains, so one search covers all of them
+    if _IMAGE_BAD_HINTS_RE.search(f"{u}\n{alt}\n{cls}\n{_id}"):
+        return False
+    if _IMAGE_GOOD_HINTS_RE.search(f"{u}\n{cls}"):
+        return True
+    return bool(alt.strip())
+
+
+def _abs_url(base: str, url: str) -> Optional[str]:
+    """Resolve a possibly relative link against the page URL; None if empty or invalid."""
+    if not url:
+        return None
+    try:
+        return urljoin(base, url)
+    except Exception:
+        return None
+
+
+# Outbound HTTP session (keep-alive connection pool), created lazily per process
+_http_session: Optional[requests.Session] = None
+_http_session_pid: Optional[int] = None
+
+
+def _get_http_session() -> requests.Session:
+    """Return the shared HTTP session, recreating it after a fork so sockets are never shared."""
+    global _http_session, _http_session_pid
+    if _http_session is None or _http_session_pid != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            # Transient throttling/gateway errors are retried too; the last response is returned as-is
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 502, 503, 504),
+                raise_on_status=False,
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_session, _http_session_pid = session, os.getpid()
+    return _http_session
+
+
+# Shared mygene client, so UniProt lookups reuse its HTTP connection pool
+_MYGENE = mygene.MyGeneInfo()
+# Species searched for UniProt IDs; "all" keeps model organisms (worm, fly, mouse, yeast) in scope
+MYGENE_SPECIES = os.getenv("MYGENE_SPECIES", "all")
+
+# Downloaded images kept as data URLs, so figures seen again skip the fetch and encode
+VISION_IMAGE_CACHE_SIZE = int(os.getenv("VISION_IMG_CACHE", 128))
+
+# Larger images are downscaled/recompressed before upload; the vision model rescales anyway
+VISION_IMAGE_MAX_SIDE = 2048
+VISION_IMAGE_RECOMPRESS_MIN_BYTES = 256 * 1024
+
+# Icons, logos and banners are dropped locally instead of being sent as vision tokens
+VISION_IMAGE_MIN_SIDE = 100
+VISION_IMAGE_MAX_ASPECT = 6.0
+# Wider images are never judged by shape: alignments and gel/blot strips are long and thin
+VISION_IMAGE_ASPECT_MAX_LONG_SIDE = 1000
+# Matched against the URL's file name as whole name segments, so "silicon" or a /socialsciences/ path don't hit
+_NON_FIGURE_URL_RE = re.compile(r"(?:^|[_.-])(?:logo|icon|favicon|sprite|avatar|social)s?(?:[_.-]|$)")
+
 
 @function_tool
-def get_uniprot_id(gene_name: str) -> str:
+async def get_uniprot_id(gene_name: str) -> str:
     """
     Get UniProt Swiss-Prot ID for a given gene name using mygene service.
 
@@ -39,41 +217,118 @@ def get_uniprot_id(gene_name: str) -> str:
     Returns:
         UniProt Swiss-Prot ID as string, or empty string if not found
     """
-    try:
-        mg = mygene.MyGeneInfo()
-        res = mg.query(gene_name, fields="uniprot")
-
-        if not res or "hits" not in res or not res["hits"]:
-            return ""
-
-        # Try to get Swiss-Prot ID from the hits
-        for hit in res["hits"]:
-            if "uniprot" in hit and hit["uniprot"]:
-                uniprot_data = hit["uniprot"]
-
-                # Check if it's a dict with Swiss-Prot key
-                if isinstance(uniprot_data, dict) and "Swiss-Prot" in uniprot_data:
-                    swiss_prot = uniprot_data["Swiss-Prot"]
-                    if swiss_prot:
-                        # Swiss-Prot can be a string or list
-                        if isinstance(swiss_prot, list):
-                            return swiss_prot[0] if swiss_prot else ""
-                        else:
-                            return str(swiss_prot)
-
-                # If Swiss-Prot not available, check if uniprot is directly a string
-                elif isinstance(uniprot_data, str):
-                    return uniprot_data
-
-                # If uniprot is a list, take the first one
-                elif isinstance(uniprot_data, list) and uniprot_data:
-                    return str(uniprot_data[0])
+    # Blocking cache and mygene I/O runs in a worker thread so concurrent tool calls overlap
+    return await asyncio.to_thread(_get_uniprot_id, gene_name)
 
+
+def _get_uniprot_id(gene_name: str) -> str:
+    gene = gene_name.strip().upper()
+    if not gene:
         return ""
+    cached = get_cached_uniprot_id(gene)
+    if cached is not None:
+        return cached
+    uniprot_id = _query_uniprot_id(gene_name.strip())
+    if uniprot_id:
+        cache_uniprot_id(gene, uniprot_id)
+    return uniprot_id
 
-    except Exception:
+
+@function_tool
+async def get_uniprot_ids(gene_names: List[str]) -> dict[str, str]:
+    """
+    Get UniProt Swiss-Prot IDs for several gene names with a single mygene request.
+
+    Args:
+        gene_names: Gene names to query (e.g., ["NFE2L2", "KEAP1", "TP53"])
+
+    Returns:
+        Mapping of each gene name to its UniProt Swiss-Prot ID (empty string if not found)
+    """
+    return await asyncio.to_thread(_get_uniprot_ids, gene_names)
+
+
+def _get_uniprot_ids(gene_names: List[str]) -> dict[str, str]:
+    genes = list(dict.fromkeys(name.strip().upper() for name in gene_names if name.strip()))
+
+    uniprot_ids = {}
+    missing = []
+    for gene in genes:
+        cached = get_cached_uniprot_id(gene)
+        if cached is None:
+            missing.append(gene)
+        else:
+            uniprot_ids[gene] = cached
+
+    # Only genes not in the cache go over the network
+    if missing:
+        fetched = _lookup_uniprot_ids(missing)
+        # Names the batch can't resolve get the full-text single-gene query
+        for gene in missing:
+            if not fetched.get(gene):
+                fetched[gene] = _query_uniprot_id(gene)
+        for gene, uniprot_id in fetched.items():
+            if uniprot_id:
+                cache_uniprot_id(gene, uniprot_id)
+        uniprot_ids.update(fetched)
+
+    return {name: uniprot_ids.get(name.strip().upper(), "") for name in gene_names}
+
+
+def _query_uniprot_id(gene_name: str) -> str:
+    """Full-text mygene query for one gene (symbols, aliases and names). Returns empty string if not found."""
+    try:
+        res = _MYGENE.query(gene_name, fields="uniprot", species=MYGENE_SPECIES)
+    except Exception as e:
+        logger.error(f"UniProt lookup failed for {gene_name}: {str(e)}")
+        return ""
+
+    for hit in (res or {}).get("hits", []):
+        uniprot_id = _extract_uniprot_id(hit.get("uniprot"))
+        if uniprot_id:
+            return uniprot_id
+    return ""
+
+
+def _lookup_uniprot_ids(genes: List[str]) -> dict[str, str]:
+    """Query mygene for several genes in one POST request. Genes without an ID map to empty string."""
+    try:
+        hits = _MYGENE.querymany(genes, scopes="symbol,alias", fields="uniprot", species=MYGENE_SPECIES, verbose=False)
+    except Exception as e:
+        logger.error(f"Batch UniProt lookup failed for {len(genes)} genes: {str(e)}")
+        return {}
+
+    uniprot_ids = {gene: "" for gene in genes}
+    for hit in hits:
+        gene = str(hit.get("query", "")).upper()
+        if gene in uniprot_ids and not uniprot_ids[gene]:
+            uniprot_ids[gene] = _extract_uniprot_id(hit.get("uniprot"))
+    return uniprot_ids
+
+
+def _extract_uniprot_id(uniprot_data) -> str:
+    """Pick the Swiss-Prot ID out of a mygene "uniprot" field. Returns empty string if absent."""
+    if not uniprot_data:
         return ""
 
+    # Check if it's a dict with Swiss-Prot key
+    if isinstance(uniprot_data, dict):
+        swiss_prot = uniprot_data.get("Swiss-Prot")
+        # Swiss-Prot can be a string or list
+        if isinstance(swiss_prot, list):
+            return str(swiss_prot[0]) if swiss_prot else ""
+        return str(swiss_prot) if swiss_prot else ""
+
+    # If Swiss-Prot not available, check if uniprot is directly a string
+    if isinstance(uniprot_data, str):
+        return uniprot_data
+
+    # If uniprot is a list, take the first one
+    if isinstance(uniprot_data, list):
+        return str(uniprot_data[0])
+
+    return ""
+
 
 @function_tool
 async def save_to_database(
@@ -107,17 +362,9 @@ async def save_to_database(
     Returns:
         Success message with database ID
     """
-    citations_data = citations or []
-
     logger.info(f"save_to_database called for gene: {gene}")
     try:
-        # Since this is now an async function, we can directly use async/await
         async for db_session in get_db():
-            logger.info("Got database session")
-            # Create created_at timestamp
-            created_at = datetime.now(timezone.utc)
-
-            logger.info(f"Calling DatabaseService.save_sequence_data for {gene}")
             sequence_id = await DatabaseService.save_sequence_data(
                 gene=gene,
                 protein_uniprot_id=protein_uniprot_id,
@@ -127,9 +374,9 @@ async def save_to_database(
                 effect=effect,
                 is_longevity_related=is_longevity_related,
                 longevity_association=longevity_association,
-                citations=citations_data,
+                citations=citations or [],
                 article_url=article_url,
-                created_at=created_at,
+                created_at=datetime.now(timezone.utc),
                 db_session=db_session,
             )
             logger.info(f"Database save completed with ID: {sequence_id}")
@@ -140,7 +387,32 @@ async def save_to_database(
 
 
 @function_tool
-def fetch_article_content(url: str) -> ArticleContext:
+async def save_genes_to_database(genes: List[ParsingGene]) -> str:
+    """
+    Save sequence-to-function data for all genes extracted from an article in one call.
+
+    Args:
+        genes: One entry per gene/modification, with the same fields as ParsingOutput.genes
+
+    Returns:
+        Success message with database IDs
+    """
+    logger.info(f"save_genes_to_database called for {len(genes)} genes")
+    try:
+        created_at = datetime.now(timezone.utc)
+        rows = [{**gene.model_dump(), "created_at": created_at} for gene in genes]
+
+        async for db_session in get_db():
+            sequence_ids = await DatabaseService.save_sequence_data_bulk(rows, db_session)
+            logger.info(f"Database save completed with IDs: {sequence_ids}")
+            return f"Successfully saved sequence-to-function data to PostgreSQL with IDs: {sequence_ids}"
+    except Exception as e:
+        logger.error(f"Database save failed for {len(genes)} genes: {str(e)}", exc_info=True)
+        return f"Database save failed: {str(e)}"
+
+
+@function_tool
+async def fetch_article_content(url: str) -> ArticleContext:
     """
     Fetch and extract content from a research article URL including text, images, and PDFs.
     Args:
@@ -149,166 +421,169 @@ def fetch_article_content(url: str) -> ArticleContext:
     Returns:
         ArticleContext object with extracted text and image URLs
     """
-    try:
+    # Download and HTML parsing run in a worker thread so the event loop stays free
+    return await asyncio.to_thread(_get_article_content, url)
 
-        def _abs(base: str, url: str) -> Optional[str]:
-            if not url:
-                return None
-            try:
-                return urllib.parse.urljoin(base, url)
-            except Exception:
-                return None
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Accept-Encoding": "gzip, deflate, br",
-            "DNT": "1",
-            "Connection": "keep-alive",
-            "Upgrade-Insecure-Requests": "1",
-            "Sec-Fetch-Dest": "document",
-            "Sec-Fetch-Mode": "navigate",
-            "Sec-Fetch-Site": "none",
-            "Sec-Fetch-User": "?1",
-            "Cache-Control": "max-age=0",
-        }
 
-        response = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
+@function_tool
+async def fetch_article_contents(urls: List[str]) -> List[ArticleContext]:
+    """
+    Fetch and extract content from several research article URLs concurrently.
+    Args:
+        urls: URLs of the articles to fetch
 
-        # Check if we were redirected to an unsupported browser page
-        if "unsupported_browser" in response.url or response.status_code == 400:
-            logger.warning(
-                f"Detected browser compatibility issue with {url}. Trying alternative approach..."
-            )
-            # Try with a different, more recent User-Agent
-            alternative_headers = headers.copy()
-            alternative_headers["User-Agent"] = (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0"
-            )
-            response = requests.get(
-                url, headers=alternative_headers, timeout=30, allow_redirects=True
-            )
+    Returns:
+        ArticleContext objects in the same order as urls
+    """
+    logger.info(f"fetch_article_contents called for {len(urls)} URLs")
+    return await asyncio.gather(
+        *(asyncio.to_thread(_get_article_content, url) for url in urls)
+    )
 
-        response.raise_for_status()
 
-        soup = BeautifulSoup(response.content, "html.parser")
+def _select_content(doc):
+    """Main article container: the highest-priority selector match, first in document order on ties."""
+    return min(
+        _CONTENT_XPATH(doc),
+        key=lambda el: next(i for i, matches in enumerate(_CONTENT_RANKS) if matches(el)),
+        default=None,
+    )
 
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
 
-        # Extract main content - try common article containers
-        content_selectors = [
-            "article",
-            ".article-body",
-            ".content",
-            ".main-content",
-            "#content",
-            ".abstract",
-            ".full-text",
-        ]
+def _html_encoding(content_type: str, html: bytes) -> str:
+    """Page encoding from the HTTP header, else a <meta> declaration, else UTF-8."""
+    match = _CHARSET_RE.search(content_type) or _META_CHARSET_RE.search(html[:4096])
+    if match:
+        charset = match.group(1)
+        return charset.decode("ascii") if isinstance(charset, bytes) else charset
+    return "utf-8"
 
-        content = None
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            if elements:
-                content = elements[0]
-                break
 
-        if not content:
-            content = soup.body or soup
+def _parse_html_stream(response: requests.Response, url: str):
+    """
+    Parse a streamed HTML response with lxml's feed parser as the chunks arrive.
 
-        # Extract text
-        text = content.get_text()
+    No full-body bytes object is built, and reading stops at ARTICLE_MAX_BYTES (the rest
+    is never downloaded). Returns the root element, or None for an empty document.
+    """
+    chunks = response.iter_content(chunk_size=65536)
+    first = next(chunks, b"")
+    encoding = _html_encoding(response.headers.get("content-type") or "", first)
+    try:
+        parser = lxml.html.HTMLParser(encoding=encoding)
+    except LookupError:
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+
+    size = 0
+    for chunk in itertools.chain((first,), chunks):
+        chunk = chunk[: ARTICLE_MAX_BYTES - size]
+        if chunk:
+            parser.feed(chunk)
+            size += len(chunk)
+        if size >= ARTICLE_MAX_BYTES:
+            logger.warning(f"Article body truncated at {ARTICLE_MAX_BYTES} bytes: {url}")
+            break
 
-        # Clean up text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = " ".join(chunk for chunk in chunks if chunk)
+    try:
+        return parser.close()
+    except etree.XMLSyntaxError:
+        return None
+
+
+def _get_article_content(url: str) -> ArticleContext:
+    """Return the parsed article from the TTL cache, fetching on a miss. Failed fetches are not cached."""
+    now = time.monotonic()
+    with _article_cache_lock:
+        entry = _article_cache.get(url)
+        if entry is not None and now - entry[0] < ARTICLE_CACHE_TTL:
+            _article_cache.move_to_end(url)
+            logger.info(f"Article cache hit: {url}")
+            return entry[1]
+
+    article = _fetch_article_content(url)
+    if article.error is None:
+        with _article_cache_lock:
+            _article_cache[url] = (now, article)
+            _article_cache.move_to_end(url)
+            if len(_article_cache) > ARTICLE_CACHE_SIZE:
+                _article_cache.popitem(last=False)
+    return article
+
+
+def _fetch_article_content(url: str) -> ArticleContext:
+    try:
+        # Bodies are streamed so the redirect check and status check happen before download
+        response = _get_http_session().get(
+            url, headers=_ARTICLE_HEADERS, timeout=ARTICLE_FETCH_TIMEOUT, allow_redirects=True, stream=True
+        )
+
+        # Check if we were redirected to an unsupported browser page
+        if "unsupported_browser" in response.url or response.status_code == 400:
+            logger.warning(
+                f"Detected browser compatibility issue with {url}. Trying alternative approach..."
+            )
+            response.close()
+            # Try with a different, more recent User-Agent
+            response = _get_http_session().get(
+                url, headers=_ARTICLE_FALLBACK_HEADERS, timeout=ARTICLE_FETCH_TIMEOUT, allow_redirects=True, stream=True
+            )
 
-        # Remove excessive whitespace
-        text = re.sub(r"\s+", " ", text).strip()
+        # Raw lxml tree (no BeautifulSoup wrapper), built while the body downloads
+        with response:
+            response.raise_for_status()
+            doc = _parse_html_stream(response, url)
+        # An empty body leaves nothing to extract
+        if doc is None:
+            return ArticleContext(article_url=url, text="", image_urls=[], pdf_urls=[])
+
+        # Remove script/style elements and comments in one C-level pass, then collect images and links
+        etree.strip_elements(doc, etree.Comment, "script", "style", with_tail=False)
+        img_tags = []
+        link_tags = []
+        for tag in doc.iter("img", "a"):
+            if tag.tag == "img":
+                img_tags.append(tag)
+            elif tag.get("href") is not None:
+                link_tags.append(tag)
+
+        # Extract main content - first matching container in priority order
+        content = _select_content(doc)
+        if content is None:
+            content = doc.find("body")
+        if content is None:
+            content = doc
+
+        # Text nodes are joined without a separator (as get_text() did), so inline markup like
+        # Ser<sup>40</sup> or <i>daf</i>-2 stays intact; whitespace is then collapsed in one pass
+        text = _WS_RE.sub(" ", "".join(content.itertext())).strip()
+
+        # Keep long articles within the prompt budget
+        text = select_relevant_chunks(text, ARTICLE_TEXT_TOKEN_BUDGET)
 
         # Extract images and PDFs - wrapped in try-except to handle blocked content
         image_urls: List[str] = []
         pdf_urls: List[str] = []
 
         try:
-            BAD_EXT = (
-                ".svg",
-                ".ico",
-                ".gif",
-            )  # Images with these extensions are often logos or icons
-            GOOD_HINTS = (
-                "figure",
-                "fig",
-                "graph",
-                "plot",
-                "gel",
-                "western",
-                "microscop",
-                "blot",
-                "supp",
-                "supplement",
-            )
-            BAD_HINTS = (
-                "logo",
-                "icon",
-                "avatar",
-                "sprite",
-                "banner",
-                "ad",
-                "advert",
-                "cookie",
-                "gdpr",
-                "social",
-                "share",
-                "header",
-                "footer",
-                "nav",
-            )
-
-            def is_relevant(img_tag, abs_url: str) -> bool:
-                u = abs_url.lower()
-                alt = (img_tag.get("alt") or "").lower()
-                cls = " ".join(img_tag.get("class") or []).lower()
-                _id = (img_tag.get("id") or "").lower()
-                if any(u.endswith(ext) for ext in BAD_EXT):
-                    return False
-                if any(b in u for b in BAD_HINTS):
-                    return False
-                if any(b in alt for b in BAD_HINTS):
-                    return False
-                if any(b in cls for b in BAD_HINTS):
-                    return False
-                if any(b in _id for b in BAD_HINTS):
-                    return False
-                if any(g in u for g in GOOD_HINTS) or any(g in cls for g in GOOD_HINTS):
-                    return True
-                return bool(alt.strip())
-
-            # Extract image URLs
-            urls: List[str] = []
-            for img in soup.find_all("img"):
-                src = img.get("src") or img.get("data-src")
-                if not src:
-                    continue
-
-                checked_img_url = _abs(url, src)
-                if checked_img_url and is_relevant(img, checked_img_url):
-                    urls.append(checked_img_url)
-
-            image_urls = list(dict.fromkeys(urls))[:8]
+            # Extract image URLs, deduplicated in first-seen order
+            image_urls = list(
+                dict.fromkeys(
+                    img_url
+                    for img in img_tags
+                    if (img_url := _abs_url(url, img.get("src") or img.get("data-src")))
+                    and _is_relevant_image(img, img_url)
+                )
+            )[:8]
 
             # Extract PDF URLs
-            for a in soup.find_all("a", href=True):
-                href = a["href"]
-                if href and href.lower().endswith(".pdf"):
-                    pu = _abs(url, href)
-                    if pu:
-                        pdf_urls.append(pu)
-            pdf_urls = list(dict.fromkeys(pdf_urls))
+            pdf_urls = list(
+                dict.fromkeys(
+                    pdf_url
+                    for a in link_tags
+                    if a.get("href").lower().endswith(".pdf")
+                    and (pdf_url := _abs_url(url, a.get("href")))
+                )
+            )
 
             logger.info(
                 f"Successfully extracted {len(image_urls)} images and {len(pdf_urls)} PDFs from {url}"
@@ -339,15 +614,17 @@ def fetch_article_content(url: str) -> ArticleContext:
         )
 
 
-def _download_b64(url: str) -> str:
-    """Download an image and convert to base64 data URL. Raises exception on failure."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
-        "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": "https://www.google.com/",
-    }
-    resp = requests.get(url, headers=headers, timeout=30)
+@lru_cache(maxsize=VISION_IMAGE_CACHE_SIZE)
+def _download_b64(url: str) -> Optional[str]:
+    """
+    Download an image and convert to base64 data URL. Raises exception on failure.
+    Returns None for obvious non-figures (logos, icons, banners), which are not worth a vision call.
+    """
+    if _NON_FIGURE_URL_RE.search(urlparse(url).path.rsplit("/", 1)[-1].lower()):
+        logger.info(f"Skipping non-figure image (URL pattern): {url}")
+        return None
+
+    resp = _get_http_session().get(url, headers=_IMAGE_HEADERS, timeout=30)
     resp.raise_for_status()
 
     # Validate it's actually an image
@@ -355,41 +632,100 @@ def _download_b64(url: str) -> str:
     if not content_type.startswith("image/"):
         raise ValueError(f"URL did not return an image (content-type: {content_type})")
 
-    return "data:image/*;base64," + base64.b64encode(resp.content).decode("utf-8")
+    if _is_non_figure_image(resp.content):
+        logger.info(f"Skipping non-figure image (size/aspect): {url}")
+        return None
+
+    data, mime = _preprocess_image(resp.content, content_type.split(";")[0].strip())
+
+    # SIMD base64 codec; builds the data URL in one step instead of concatenating copies
+    return f"data:{mime};base64,{pybase64.b64encode_as_string(data)}"
 
 
-def _download_pdf_b64(url: str) -> Tuple[str, str, str]:
+def _is_non_figure_image(data: bytes) -> bool:
+    """Icon-sized or banner-shaped (small and elongated) images, judged from the image header only."""
+    try:
+        with Image.open(BytesIO(data)) as img:
+            width, height = img.size
+    except Exception:
+        return False
+    short_side, long_side = sorted((width, height))
+    if short_side < VISION_IMAGE_MIN_SIDE:
+        return True
+    return long_side < VISION_IMAGE_ASPECT_MAX_LONG_SIDE and long_side / short_side > VISION_IMAGE_MAX_ASPECT
+
+
+def _preprocess_image(data: bytes, mime: str) -> Tuple[bytes, str]:
     """
-    Download a PDF and return (base64_string, content_type, filename).
-    Tries direct download and with ?download=1 parameter, validates PDF signature.
+    Downscale and recompress a large image before it is base64-encoded for the vision API.
+    Photos become JPEG; line art (bilevel, greyscale, palette) and images with alpha stay PNG.
+    Small or unreadable images, and recompressions that don't shrink, are passed through.
+    Returns (image_bytes, mime_type).
     """
-    from urllib.parse import urlparse, urlunparse, urlencode, parse_qs
+    if len(data) < VISION_IMAGE_RECOMPRESS_MIN_BYTES:
+        return data, mime
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.thumbnail((VISION_IMAGE_MAX_SIDE, VISION_IMAGE_MAX_SIDE), Image.LANCZOS)
+            buf = BytesIO()
+            if img.mode in ("1", "L", "LA", "P", "RGBA"):
+                img.save(buf, format="PNG", optimize=True)
+                out_mime = "image/png"
+            else:
+                img.convert("RGB").save(buf, format="JPEG", quality=85, optimize=True)
+                out_mime = "image/jpeg"
+    except Exception as e:
+        logger.warning(f"Could not preprocess image, sending original: {str(e)}")
+        return data, mime
+
+    out = buf.getvalue()
+    if len(out) >= len(data):
+        return data, mime
+    return out, out_mime
 
-    session = requests.Session()
+
+def _download_pdf(url: str) -> Tuple[bytes, str]:
+    """
+    Download a PDF and return (pdf_bytes, filename).
+    Tries direct download and with ?download=1 parameter, validates PDF signature.
+    """
+    session = _get_http_session()
 
     def is_pdf_bytes(b: bytes) -> bool:
         head = b[:4096].lstrip(b"\xef\xbb\xbf\r\n\t \x00")
         return head.startswith(b"%PDF")
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
-        "Accept": "application/pdf,application/octet-stream;q=0.9,*/*;q=0.8",
-    }
-
-    def get(u: str):
-        r = session.get(u, headers=headers, timeout=60, allow_redirects=True)
-        r.raise_for_status()
-        ct = (r.headers.get("content-type") or "").lower()
-        return r, ct
+    def get(u: str) -> Tuple[Optional[bytes], str]:
+        """Fetch u; the body is None (and the rest never downloaded) unless the type and first bytes say PDF."""
+        with session.get(u, headers=_PDF_HEADERS, timeout=60, allow_redirects=True, stream=True) as r:
+            r.raise_for_status()
+            ct = (r.headers.get("content-type") or "").lower()
+            if not (ct.startswith("application/pdf") or ct.startswith("application/octet-stream")):
+                return None, ct
+
+            chunks = r.iter_content(chunk_size=65536)
+            body = bytearray()
+            for chunk in chunks:
+                body += chunk
+                if len(body) >= 4096:
+                    break
+            # Interstitial HTML pages are dropped after the first chunk
+            if not is_pdf_bytes(body):
+                return None, ct
+
+            for chunk in chunks:
+                body += chunk
+                # A truncated PDF is unreadable, so oversized files are rejected rather than cut
+                if len(body) > PDF_MAX_BYTES:
+                    raise ValueError(f"PDF exceeds {PDF_MAX_BYTES} bytes: {u}")
+        return bytes(body), ct
 
     # 1) Direct attempt
-    resp, ct = get(url)
-    if (
-        ct.startswith("application/pdf") or ct.startswith("application/octet-stream")
-    ) and is_pdf_bytes(resp.content):
-        b64 = base64.b64encode(resp.content).decode("ascii")
+    body, ct = get(url)
+    if body is not None:
         filename = url.split("?")[0].split("/")[-1] or "document.pdf"
-        return b64, "application/pdf", filename
+        return body, filename
 
     # 2) Try with ?download=1 (often helps with PMC/CDN)
     parsed = urlparse(url)
@@ -401,21 +737,126 @@ def _download_pdf_b64(url: str) -> Tuple[str, str, str]:
     url_dl = urlunparse(parsed._replace(query=new_query))
 
     if url_dl != url:
-        resp2, ct2 = get(url_dl)
-        if (
-            ct2.startswith("application/pdf")
-            or ct2.startswith("application/octet-stream")
-        ) and is_pdf_bytes(resp2.content):
-            b64 = base64.b64encode(resp2.content).decode("ascii")
+        body2, _ = get(url_dl)
+        if body2 is not None:
             filename = url.split("?")[0].split("/")[-1] or "document.pdf"
-            return b64, "application/pdf", filename
+            return body2, filename
 
     # If we got here - it's not a PDF
     raise ValueError(f"URL did not return a PDF (content-type: {ct or 'unknown'})")
 
 
+@lru_cache(maxsize=1)
+def _get_openai_client() -> OpenAI:
+    """Shared OpenAI client for vision calls, so requests reuse its connection pool."""
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+# Uploaded PDFs are deleted by OpenAI after this long, so restarts can't pile files up
+PDF_FILE_TTL = 24 * 3600
+# SHA-256 of uploaded PDF bytes -> (file id, expiry), so a PDF seen again is referenced, not re-sent
+PDF_FILE_CACHE_SIZE = 256
+_pdf_file_ids: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+_pdf_file_ids_lock = threading.Lock()
+
+
+def _upload_pdf(data: bytes, filename: str) -> str:
+    """Upload a PDF to the OpenAI Files API once per content hash and return its file id."""
+    digest = hashlib.sha256(data).hexdigest()
+    now = time.time()
+    with _pdf_file_ids_lock:
+        entry = _pdf_file_ids.get(digest)
+        # Leave an hour of margin so a reused id doesn't expire mid-request
+        if entry is not None and entry[1] - now > 3600:
+            _pdf_file_ids.move_to_end(digest)
+            return entry[0]
+
+    uploaded = _get_openai_client().files.create(
+        file=(filename, data, "application/pdf"),
+        purpose="user_data",
+        expires_after={"anchor": "created_at", "seconds": PDF_FILE_TTL},
+    )
+    with _pdf_file_ids_lock:
+        _pdf_file_ids[digest] = (uploaded.id, now + PDF_FILE_TTL)
+        _pdf_file_ids.move_to_end(digest)
+        if len(_pdf_file_ids) > PDF_FILE_CACHE_SIZE:
+            _pdf_file_ids.popitem(last=False)
+    return uploaded.id
+
+
+def _pdf_input_part(url: str) -> dict:
+    """
+    Download a PDF and build its input_file part: a file id reference when the upload
+    succeeds, inline base64 data otherwise.
+    """
+    data, filename = _download_pdf(url)
+    try:
+        return {"type": "input_file", "file_id": _upload_pdf(data, filename)}
+    except Exception as e:
+        logger.warning(f"PDF upload failed for {url}, sending it inline: {str(e)}")
+        return {
+            "type": "input_file",
+            "file_data": f"data:application/pdf;base64,{pybase64.b64encode_as_string(data)}",
+            "filename": filename,
+        }
+
+
+_VISION_SYSTEM_PROMPT = """
+            You are a scientific figure analyst.
+            For each provided image/pdf:
+            1) Classify its type (e.g., 'western blot', 'microscopy', 'diagram', 'logo', 'icon', 'banner').
+            2) Decide if the image is relevant to sequence-function analysis (relevance: true/false).
+            3) Provide a relevance_score in [0.0, 1.0] and a short reason.
+            4) If relevant, provide details about:
+            - proteins, modifications (with positions if visible),
+            - concise OCR-like summary (ocr_text),
+            - 1-3 concise claims.
+            Return one JSON object per input image (same order), with the schema ImageNotes.
+            If not relevant, still return the object with relevance=false, relevance_score, reason, and image_url; leave other fields empty.
+        """
+
+_VISION_TEXT_FORMAT = {
+    "format": {
+        "type": "json_schema",
+        "name": "ImageNotes",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "notes": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "url": {"type": "string"},
+                            "kind": {
+                                "type": "string",
+                                "enum": ["image", "pdf"],
+                            },
+                            "description": {"type": "string"},
+                            "relevance": {"type": "boolean"},
+                            "relevance_score": {"type": "number"},
+                        },
+                        "required": [
+                            "url",
+                            "kind",
+                            "description",
+                            "relevance",
+                            "relevance_score",
+                        ],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["notes"],
+            "additionalProperties": False,
+        },
+        "strict": True,
+    }
+}
+
+
 @function_tool
-def vision_media(
+async def vision_media(
     image_urls: list[str],
     pdf_urls: list[str],
     hint: Optional[str] = None,
@@ -441,6 +882,16 @@ def vision_media(
     Returns:
         List of MediaNote objects with relevance scores and descriptions for each image/PDF
     """
+    # Downloads and the blocking OpenAI call run in a worker thread so the event loop stays free
+    return await asyncio.to_thread(_vision_media, image_urls, pdf_urls, hint, pdf_max_pages)
+
+
+def _vision_media(
+    image_urls: list[str],
+    pdf_urls: list[str],
+    hint: Optional[str],
+    pdf_max_pages: int,
+) -> List[MediaNote]:
     logger.info(
         f"🔍 vision_media CALLED: {len(image_urls)} images, {len(pdf_urls)} PDFs"
     )
@@ -450,64 +901,47 @@ def vision_media(
             logger.warning("⚠️ vision_media: No media to analyze (empty lists)")
             return []
 
-        # Initialize OpenAI client early
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        sys_prompt = """
-            You are a scientific figure analyst.
-            For each provided image/pdf:
-            1) Classify its type (e.g., 'western blot', 'microscopy', 'diagram', 'logo', 'icon', 'banner').
-            2) Decide if the image is relevant to sequence-function analysis (relevance: true/false).
-            3) Provide a relevance_score in [0.0, 1.0] and a short reason.
-            4) If relevant, provide details about:
-            - proteins, modifications (with positions if visible),
-            - concise OCR-like summary (ocr_text),
-            - 1-3 concise claims.
-            Return one JSON object per input image (same order), with the schema ImageNotes.
-            If not relevant, still return the object with relevance=false, relevance_score, reason, and image_url; leave other fields empty.
-        """
+        client = _get_openai_client()
         user_prompt = "Analyze provided files for sequence-function evidence."
         if hint:
             user_prompt += f" Context hint: {hint}"
 
-        parts = [{"type": "input_text", "text": user_prompt}]
+        prompt_part = {"type": "input_text", "text": user_prompt}
+        parts = []
         successful_images = 0
         successful_pdfs = 0
 
-        # Process image URLs (download and convert to base64)
-        if image_urls:
-            for url in image_urls:
-                try:
-                    parts.append(
-                        {"type": "input_image", "image_url": _download_b64(url)}
-                    )
-                    successful_images += 1
-                    logger.info(f"Successfully loaded image: {url}")
-                except Exception as e:
-                    logger.error(
-                        "Failed to download image from URL: %s, error: %s", url, str(e)
-                    )
-
-        # Process PDF URLs using ResponseInputFileParam structure with base64
-        if pdf_urls:
-            for url in pdf_urls:
-                try:
-                    b64_data, content_type, filename = _download_pdf_b64(url)
-                    # Ensure all values are strings, not bytes
-                    file_data_str = f"data:{content_type};base64,{b64_data}"
-                    parts.append(
-                        {
-                            "type": "input_file",
-                            "file_data": file_data_str,
-                            "filename": str(filename),
-                        }
-                    )
-                    successful_pdfs += 1
-                    logger.info(f"Successfully added PDF: {url} ({filename})")
-                except Exception as e:
-                    logger.error(
-                        "Failed to add PDF from URL: %s, error: %s", url, str(e)
-                    )
+        # Download all images and PDFs concurrently; futures keep the input order
+        with ThreadPoolExecutor(max_workers=min(MEDIA_DOWNLOAD_WORKERS, len(image_urls) + len(pdf_urls))) as executor:
+            image_futures = [executor.submit(_download_b64, url) for url in image_urls]
+            pdf_futures = [executor.submit(_pdf_input_part, url) for url in pdf_urls]
+
+        # Process image URLs (downloaded and converted to base64)
+        for url, future in zip(image_urls, image_futures):
+            try:
+                image_url = future.result()
+                if image_url is None:
+                    continue
+                parts.append(
+                    {"type": "input_image", "image_url": image_url}
+                )
+                successful_images += 1
+                logger.info(f"Successfully loaded image: {url}")
+            except Exception as e:
+                logger.error(
+                    "Failed to download image from URL: %s, error: %s", url, str(e)
+                )
+
+        # Process PDF URLs (uploaded once and referenced by file id, or inline base64)
+        for url, future in zip(pdf_urls, pdf_futures):
+            try:
+                parts.append(future.result())
+                successful_pdfs += 1
+                logger.info(f"Successfully added PDF: {url}")
+            except Exception as e:
+                logger.error(
+                    "Failed to add PDF from URL: %s, error: %s", url, str(e)
+                )
 
         # If no images or PDFs were successfully loaded, return empty list
         if successful_images == 0 and successful_pdfs == 0:
@@ -523,77 +957,86 @@ def vision_media(
             part_type = part.get("type", "unknown")
             if part_type == "input_file":
                 logger.debug(
-                    f"Part {i}: type={part_type}, filename={part.get('filename')}, file_data_len={len(part.get('file_data', ''))}"
+                    f"Part {i}: type={part_type}, file_id={part.get('file_id')}, file_data_len={len(part.get('file_data', ''))}"
                 )
             else:
                 logger.debug(f"Part {i}: type={part_type}")
 
-        notes: List[MediaNote] = []
+        # Analyze small batches concurrently; wall-clock follows the slowest batch, not the sum
+        batches = [
+            parts[i:i + VISION_ITEMS_PER_CALL] for i in range(0, len(parts), VISION_ITEMS_PER_CALL)
+        ]
+        with ThreadPoolExecutor(max_workers=min(VISION_CONCURRENCY, len(batches))) as executor:
+            batch_notes = list(
+                executor.map(lambda batch: _analyze_media_batch(client, prompt_part, batch), batches)
+            )
+        return [note for notes in batch_notes for note in notes]
+    except Exception as e:
+        logger.error(f"vision_media failed: {str(e)}", exc_info=True)
+        return []
 
+
+def _analyze_media_batch(client: OpenAI, prompt_part: dict, batch: list[dict]) -> List[MediaNote]:
+    """Run one vision request for a batch of media parts. A failed batch yields no notes."""
+    try:
         resp = client.responses.create(
             model="gpt-5-mini",
             input=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": parts},
+                {"role": "system", "content": _VISION_SYSTEM_PROMPT},
+                {"role": "user", "content": [prompt_part, *batch]},
             ],
-            text={
-                "format": {
-                    "type": "json_schema",
-                    "name": "ImageNotes",
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "notes": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "url": {"type": "string"},
-                                        "kind": {
-                                            "type": "string",
-                                            "enum": ["image", "pdf"],
-                                        },
-                                        "description": {"type": "string"},
-                                        "relevance": {"type": "boolean"},
-                                        "relevance_score": {"type": "number"},
-                                    },
-                                    "required": [
-                                        "url",
-                                        "kind",
-                                        "description",
-                                        "relevance",
-                                        "relevance_score",
-                                    ],
-                                    "additionalProperties": False,
-                                },
-                            }
-                        },
-                        "required": ["notes"],
-                        "additionalProperties": False,
-                    },
-                    "strict": True,
-                }
-            },
+            text=_VISION_TEXT_FORMAT,
         )
 
-        data = json.loads(resp.output_text or "{}")
-        items = data.get("notes", [])
-        for it in items:
-            notes.append(
-                MediaNote(
-                    url=it["url"],
-                    kind=it["kind"],
-                    description=it["description"],
-                    relevance=it["relevance"],
-                    relevance_score=float(it["relevance_score"]),
-                )
-            )
-        return notes
+        # Validate the whole list in one pydantic-core pass
+        data = orjson.loads(resp.output_text or "{}")
+        return MEDIA_NOTES_ADAPTER.validate_python(data.get("notes", []))
     except Exception as e:
-        logger.error(f"vision_media failed: {str(e)}", exc_info=True)
+        logger.error(f"Vision request failed for a batch of {len(batch)} items: {str(e)}", exc_info=True)
         return []
 
 
+# Rows returned by execute_sql_query; larger results are cut off at the cursor
+SQL_QUERY_MAX_ROWS = 10000
+
+
+def _output_columns(keys) -> List[str]:
+    """Result columns returned to the agent; the embedding field is for internal use only."""
+    return [col for col in keys if col.lower() != "embedding"]
+
+
+def _as_subquery(query: str) -> str:
+    """
+    Prepare a query for splicing into "(...) AS q": comments are stripped so a trailing
+    "--" can't swallow the closing parenthesis, along with the trailing semicolon.
+    """
+    return sqlparse.format(query, strip_comments=True).strip().rstrip(";")
+
+
+async def _exclude_embedding_column(query: str, db_session) -> str:
+    """
+    Rewrite a SELECT so the embedding column is projected out in SQL rather than in Python.
+
+    Only queries that can return it (SELECT * or an explicit embedding column) are probed,
+    with a LIMIT 0 wrapper that reads the column names without fetching rows.
+    """
+    if "*" not in query and "embedding" not in query.lower():
+        return query
+
+    inner = _as_subquery(query)
+    probe = await db_session.execute(text(f"SELECT * FROM ({inner}) AS q LIMIT 0"))
+    columns = list(probe.keys())
+    kept = _output_columns(columns)
+    if len(kept) == len(columns):
+        return query
+    # Duplicate names can't be referenced unambiguously, so the embedding can't be projected out
+    if len(set(kept)) != len(kept):
+        raise ValueError("query returns duplicate column names alongside embedding; alias the columns")
+
+    select_list = ", ".join('"' + col.replace('"', '""') + '"' for col in kept)
+    return f"SELECT {select_list} FROM ({inner}) AS q"
+
+
 @function_tool
 async def execute_sql_query(query: str) -> str:
     """
@@ -607,45 +1050,109 @@ async def execute_sql_query(query: str) -> str:
     """
     logger.info(f"Executing SQL query: {query[:100]}...")
 
-    # Security check - only allow SELECT queries
-    query_lower = query.lower().strip()
-    if not query_lower.startswith("select"):
+    # Security check - only allow a single SELECT statement (plain or WITH ... SELECT).
+    # Comments are stripped first, so a trailing "-- note" line isn't counted as a statement
+    statements = [
+        stmt for stmt in sqlparse.parse(sqlparse.format(query, strip_comments=True))
+        if str(stmt).strip(" \t\r\n;")
+    ]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
         return "Error: Only SELECT queries are allowed for security reasons"
 
     try:
         async for db_session in get_db():
-            result = await db_session.execute(text(query))
-            rows = result.fetchall()
+            # Backstop for writes hidden in data-modifying CTEs or volatile functions
+            await db_session.execute(text("SET TRANSACTION READ ONLY"))
 
-            if not rows:
+            # Keep the embedding vectors on the server
+            query = await _exclude_embedding_column(query, db_session)
+
+            # PostgreSQL builds the JSON array itself; only one text value comes back
+            inner = _as_subquery(query)
+            result = await db_session.execute(
+                text(
+                    "SELECT json_agg(t)::text, count(*) "
+                    f"FROM (SELECT * FROM ({inner}) AS q LIMIT {SQL_QUERY_MAX_ROWS}) AS t"
+                )
+            )
+            payload, row_count = result.one()
+            if row_count == SQL_QUERY_MAX_ROWS:
+                logger.warning(f"Query result capped at {SQL_QUERY_MAX_ROWS} rows")
+
+            if not row_count:
                 return "No results found for the query"
 
-            # Convert rows to list of dictionaries, filtering out embedding field
-            columns = result.keys()
-            results = []
-            for row in rows:
-                row_dict = {}
-                for i, col in enumerate(columns):
-                    # Skip embedding field - it's for internal use only
-                    if col.lower() == "embedding":
-                        continue
-
-                    value = row[i]
-                    # Handle JSON fields
-                    if isinstance(value, (dict, list)):
-                        row_dict[col] = value
-                    else:
-                        row_dict[col] = str(value) if value is not None else None
-                results.append(row_dict)
-
-            logger.info(f"Query returned {len(results)} rows")
-            return json.dumps(results, indent=2, default=str)
+            logger.info(f"Query returned {row_count} rows")
+            return payload
 
     except Exception as e:
         logger.error(f"SQL query failed: {str(e)}")
         return f"Query execution failed: {str(e)}"
 
 
+# Built once so SQLAlchemy's compiled cache and asyncpg's prepared statement are reused.
+# The query vector is bound and parsed once, then reused via scalar subqueries
+# (still index-usable in ORDER BY, like a bound parameter).
+_SEMANTIC_SEARCH_SQL = text(
+    """
+    WITH q AS (SELECT CAST(:query_embedding AS vector) AS v)
+    SELECT
+        id,
+        gene,
+        protein_uniprot_id,
+        modification_type,
+        interval,
+        function,
+        effect,
+        is_longevity_related,
+        longevity_association,
+        citations,
+        article_url,
+        1 - (embedding <=> (SELECT v FROM q)) as similarity
+    FROM sequence_data
+    WHERE embedding IS NOT NULL
+        AND (1 - (embedding <=> (SELECT v FROM q))) >= :min_similarity
+    ORDER BY embedding <=> (SELECT v FROM q)
+    LIMIT :limit
+"""
+).bindparams(
+    bindparam("query_embedding", type_=String),
+    bindparam("min_similarity", type_=Float),
+    bindparam("limit", type_=Integer),
+)
+
+
+# Query vectors for semantic_search, keyed by lowercased, whitespace-normalized query
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+_query_embedding_cache: OrderedDict[str, str] = OrderedDict()
+
+
+async def _get_query_embedding_literal(embedding_service, query: str) -> Optional[str]:
+    """
+    Return the query embedding as a pgvector text literal, reusing earlier results.
+
+    Repeated queries skip the OpenAI round trip and the float formatting. Only ever
+    touched from the event loop, so no lock is needed.
+    """
+    key = " ".join(query.lower().split())
+    literal = _query_embedding_cache.get(key)
+    if literal is not None:
+        _query_embedding_cache.move_to_end(key)
+        logger.info("Query embedding served from cache")
+        return literal
+
+    query_embedding = await embedding_service.generate_embedding(query)
+    if not query_embedding:
+        return None
+    logger.info(f"✅ Embedding generated successfully! Dimensions: {len(query_embedding)}")
+
+    literal = str(query_embedding)
+    _query_embedding_cache[key] = literal
+    if len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+        _query_embedding_cache.popitem(last=False)
+    return literal
+
+
 @function_tool
 async def semantic_search(
     query: str, limit: int = 5, min_similarity: float = 0.5
@@ -695,90 +1202,49 @@ async def semantic_search(
     try:
         # Generate embedding for the query
         logger.info(f"📊 Generating embedding for query...")
-        query_embedding = await embedding_service.generate_embedding(query)
+        query_embedding = await _get_query_embedding_literal(embedding_service, query)
         if not query_embedding:
             error_msg = "Error: Failed to generate embedding for the query"
             logger.error(f"❌ {error_msg}")
             return error_msg
 
-        logger.info(
-            f"✅ Embedding generated successfully! Dimensions: {len(query_embedding)}"
-        )
-
         # Perform similarity search using cosine distance with threshold
         logger.info(f"🔎 Executing vector similarity search in PostgreSQL...")
         async for db_session in get_db():
-            sql_query = text(
-                """
-                SELECT
-                    id,
-                    gene,
-                    protein_uniprot_id,
-                    modification_type,
-                    interval,
-                    function,
-                    effect,
-                    is_longevity_related,
-                    longevity_association,
-                    citations,
-                    article_url,
-                    1 - (embedding <=> :query_embedding) as similarity
-                FROM sequence_data
-                WHERE embedding IS NOT NULL
-                    AND (1 - (embedding <=> :query_embedding)) >= :min_similarity
-                ORDER BY embedding <=> :query_embedding
-                LIMIT :limit
-            """
-            )
-
             logger.info(
                 f"Executing pgvector similarity search with limit {limit}, min_similarity {min_similarity}"
             )
             result = await db_session.execute(
-                sql_query,
+                _SEMANTIC_SEARCH_SQL,
                 {
-                    "query_embedding": str(query_embedding),
+                    "query_embedding": query_embedding,
                     "limit": limit,
                     "min_similarity": min_similarity,
                 },
             )
-            rows = result.fetchall()
+            rows = result.mappings().all()
             logger.info(
                 f"✅ Query executed! Found {len(rows)} results (min similarity: {min_similarity})"
             )
 
             if not rows:
-                return json.dumps(
+                return orjson.dumps(
                     {
                         "message": f"No results found with similarity >= {min_similarity}. Try lowering min_similarity or check if database has records with embeddings.",
                         "query": query,
                         "min_similarity": min_similarity,
                         "results": [],
                     }
-                )
+                ).decode()
 
-            # Convert to list of dictionaries, filtering out embedding field
-            columns = result.keys()
-            results = []
-            for row in rows:
-                row_dict = {}
-                for i, col in enumerate(columns):
-                    # Skip embedding field - it's for internal use only
-                    if col.lower() == "embedding":
-                        continue
-
-                    value = row[i]
-                    if isinstance(value, (dict, list)):
-                        row_dict[col] = value
-                    elif col == "similarity":
-                        # Format similarity as percentage
-                        row_dict[col] = f"{float(value) * 100:.2f}%"
-                    else:
-                        row_dict[col] = str(value) if value is not None else None
-                results.append(row_dict)
+            # The SELECT list never includes embedding; orjson encodes the values natively
+            results = [dict(row) for row in rows]
+            for row_dict in results:
+                # Format similarity as percentage
+                row_dict["similarity"] = f"{float(row_dict['similarity']) * 100:.2f}%"
 
             logger.info(f"Semantic search returned {len(results)} results")
-            return json.dumps(results, indent=2, default=str)
+            return orjson.dumps(results, option=orjson.OPT_INDENT_2, default=str).decode()
 
     except Exception as e:
         logger.error(f"Semantic search failed: {str(e)}")
@@ -1,11 +1,11 @@
-import json
 import logging
 import os
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import insert, select, text
+import orjson
 import pandas as pd
 from configs.database import SequenceData, get_db
 from configs.config import CSV_FILE_PATH, CSV_HEADERS
@@ -34,60 +34,115 @@ class DatabaseService:
         db_session: AsyncSession,
         export_to_csv: bool = True
     ) -> int:
-        """Save sequence data to PostgreSQL with automatic embedding generation"""
+        """Save sequence data to PostgreSQL with automatic embedding generation (single-row save_sequence_data_bulk)"""
+        [sequence_id] = await DatabaseService.save_sequence_data_bulk(
+            [{
+                'gene': gene,
+                'protein_uniprot_id': protein_uniprot_id,
+                'modification_type': modification_type,
+                'interval': interval,
+                'function': function,
+                'effect': effect,
+                'is_longevity_related': is_longevity_related,
+                'longevity_association': longevity_association,
+                'citations': citations,
+                'article_url': article_url,
+                'created_at': created_at,
+            }],
+            db_session,
+            export_to_csv=export_to_csv,
+        )
+        return sequence_id
+
+    @staticmethod
+    async def save_sequence_data_bulk(
+        rows: List[dict],
+        db_session: AsyncSession,
+        export_to_csv: bool = True
+    ) -> List[int]:
+        """
+        Save several sequence data records with a single INSERT and a single embedding request.
+
+        Args:
+            rows: Records keyed by SequenceData column names (without id and embedding)
+            db_session: Database session
+            export_to_csv: Export the table to CSV after saving (default: True)
+
+        Returns:
+            Record IDs in input order; already saved records keep their existing ID
+        """
+        if not rows:
+            return []
+
         try:
-            # Generate embedding for semantic search
-            embedding = None
-            embedding_service = get_embedding_service()
-            if embedding_service:
-                search_text = create_search_text(gene, function, effect, longevity_association)
-                if search_text:
-                    logger.info(f"📝 Generating embedding for gene: {gene}")
-                    logger.info(f"Search text: {search_text[:100]}...")
-                    embedding = await embedding_service.generate_embedding(search_text)
-                    if embedding:
-                        logger.info(f"✅ Embedding created! Dimensions: {len(embedding)}")
-                        logger.info(f"✅ Generated embedding for gene {gene} ({len(embedding)} dimensions)")
-                    else:
-                        logger.info(f"❌ Failed to generate embedding for gene {gene}")
-                        logger.warning(f"Failed to generate embedding for gene {gene}")
+            keys = [DatabaseService._record_key(row) for row in rows]
+            saved_ids = await DatabaseService._find_existing_ids(keys, db_session)
+
+            # Skip records saved by earlier runs and duplicates within this batch
+            new_rows = {}
+            for key, row in zip(keys, rows):
+                if key not in saved_ids and key not in new_rows:
+                    new_rows[key] = row
+
+            if new_rows:
+                embeddings = [None] * len(new_rows)
+                embedding_service = get_embedding_service()
+                if embedding_service:
+                    search_texts = [
+                        create_search_text(row['gene'], row['function'], row['effect'], row['longevity_association'])
+                        for row in new_rows.values()
+                    ]
+                    logger.info(f"Generating embeddings for batch of {len(search_texts)} records")
+                    embeddings = await embedding_service.generate_embeddings_batch(search_texts)
                 else:
-                    logger.info(f"⚠️  No search text for gene {gene}, skipping embedding")
-            else:
-                logger.info(f"⚠️  Embedding service not available, skipping embedding for {gene}")
-                logger.warning("Embedding service not initialized")
-
-            sequence_data = SequenceData(
-                gene=gene,
-                protein_uniprot_id=protein_uniprot_id,
-                modification_type=modification_type,
-                interval=interval,
-                function=function,
-                effect=effect,
-                is_longevity_related=is_longevity_related,
-                longevity_association=longevity_association,
-                citations=citations,
-                article_url=article_url,
-                created_at=created_at,
-                embedding=embedding
-            )
+                    logger.warning("Embedding service not initialized")
 
-            db_session.add(sequence_data)
-            await db_session.commit()
-            await db_session.refresh(sequence_data)
+                values = [
+                    {**row, 'embedding': embedding}
+                    for row, embedding in zip(new_rows.values(), embeddings)
+                ]
+                result = await db_session.execute(
+                    insert(SequenceData).returning(SequenceData.id, sort_by_parameter_order=True),
+                    values
+                )
+                saved_ids.update(zip(new_rows.keys(), result.scalars().all()))
+                await db_session.commit()
 
-            # Auto-export to CSV after saving (if enabled)
-            if export_to_csv:
-                await DatabaseService.export_to_csv(CSV_FILE_PATH, db_session)
+                # Auto-export to CSV after saving (if enabled)
+                if export_to_csv:
+                    await DatabaseService.export_to_csv(CSV_FILE_PATH, db_session)
 
-            logger.info(f"Saved sequence data with ID {sequence_data.id} for gene {gene}")
-            return sequence_data.id
+            logger.info(f"Saved {len(new_rows)} new sequence data records ({len(rows) - len(new_rows)} already present)")
+            return [saved_ids[key] for key in keys]
 
         except Exception as e:
             await db_session.rollback()
-            logger.error(f"Error saving sequence data for gene {gene}: {str(e)}")
+            logger.error(f"Error saving sequence data batch: {str(e)}")
             raise
-    
+
+    @staticmethod
+    def _record_key(row: dict) -> tuple:
+        """Identity of a record for duplicate detection"""
+        return (row['gene'], row['modification_type'], row['interval'], row['article_url'])
+
+    @staticmethod
+    async def _find_existing_ids(keys: List[tuple], db_session: AsyncSession) -> dict:
+        """Map record keys to the IDs of already saved records"""
+        result = await db_session.execute(
+            select(
+                SequenceData.id,
+                SequenceData.gene,
+                SequenceData.modification_type,
+                SequenceData.interval,
+                SequenceData.article_url,
+            )
+            .where(SequenceData.article_url.in_({key[3] for key in keys}))
+        )
+        existing = {}
+        for row in result:
+            existing.setdefault((row.gene, row.modification_type, row.interval, row.article_url), row.id)
+        return existing
+
     @staticmethod
     async def get_all_sequence_data(
         db_session: AsyncSession,
@@ -161,7 +216,7 @@ class DatabaseService:
                             'effect': effect,
                             'is_longevity_related': bool(row.get('is_longevity_related', False)) if pd.notna(row.get('is_longevity_related')) else False,
                             'longevity_association': longevity_association,
-                            'citations': json.loads(row['citations']) if pd.notna(row['citations']) and row['citations'] else [],
+                            'citations': orjson.loads(row['citations']) if pd.notna(row['citations']) and row['citations'] else [],
                             'article_url': str(row.get('article_url', '')) if pd.notna(row.get('article_url')) else '',
                             'created_at': datetime.fromisoformat(row['created_at']) if pd.notna(row['created_at']) and row['created_at'] else datetime.now(timezone.utc),
                         }
@@ -184,32 +239,15 @@ class DatabaseService:
                     embeddings = await embedding_service.generate_embeddings_batch(batch_texts)
                     logger.info(f"Generated {sum(1 for e in embeddings if e is not None)} embeddings")
 
-                # Save records to database
-                for i, record_data in enumerate(batch_records):
-                    try:
-                        # Add embedding if available
-                        embedding = embeddings[i] if i < len(embeddings) else None
-
-                        sequence_data = SequenceData(
-                            gene=record_data['gene'],
-                            protein_uniprot_id=record_data['protein_uniprot_id'],
-                            modification_type=record_data['modification_type'],
-                            interval=record_data['interval'],
-                            function=record_data['function'],
-                            effect=record_data['effect'],
-                            is_longevity_related=record_data['is_longevity_related'],
-                            longevity_association=record_data['longevity_association'],
-                            citations=record_data['citations'],
-                            article_url=record_data['article_url'],
-                            created_at=record_data['created_at'],
-                            embedding=embedding
-                        )
-
-                        db_session.add(sequence_data)
-
-                    except Exception as e:
-                        logger.error(f"Error saving record {record_data.get('gene', 'unknown')}: {str(e)}")
-                        continue
+                # Save the batch with a single executemany INSERT
+                if batch_records:
+                    await db_session.execute(
+                        insert(SequenceData),
+                        [
+                            {**record_data, 'embedding': embeddings[i] if i < len(embeddings) else None}
+                            for i, record_data in enumerate(batch_records)
+                        ]
+                    )
 
                 # Commit batch
                 await db_session.commit()
@@ -245,7 +283,7 @@ class DatabaseService:
                     'effect': record.effect,
                     'is_longevity_related': record.is_longevity_related,
                     'longevity_association': record.longevity_association,
-                    'citations': json.dumps(record.citations) if record.citations else '',
+                    'citations': orjson.dumps(record.citations).decode() if record.citations else '',
                     'article_url': record.article_url,
                     'created_at': record.created_at.isoformat() if record.created_at else '',
                 })
@@ -5,6 +5,9 @@ from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of inputs the embeddings endpoint accepts per request
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+
 
 class EmbeddingService:
     """Service for generating embeddings using OpenAI API"""
@@ -66,17 +69,16 @@ class EmbeddingService:
             if not valid_texts:
                 return [None] * len(texts)
 
-            # Generate embeddings for valid texts
-            response = await self.client.embeddings.create(
-                model=self.model,
-                input=valid_texts
-            )
-
-            # Map results back to original indices
+            # One request per EMBEDDING_BATCH_MAX_INPUTS texts; results map back to original indices
             results = [None] * len(texts)
-            for i, embedding_data in enumerate(response.data):
-                original_index = valid_indices[i]
-                results[original_index] = embedding_data.embedding
+            for start in range(0, len(valid_texts), EMBEDDING_BATCH_MAX_INPUTS):
+                response = await self.client.embeddings.create(
+                    model=self.model,
+                    input=valid_texts[start:start + EMBEDDING_BATCH_MAX_INPUTS]
+                )
+                for embedding_data in response.data:
+                    original_index = valid_indices[start + embedding_data.index]
+                    results[original_index] = embedding_data.embedding
 
             logger.debug(f"Generated {len(valid_texts)} embeddings in batch")
             return results
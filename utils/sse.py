@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import json
+import orjson
 import uuid
 from typing import Any
 
@@ -34,5 +34,5 @@ def json_event(event: str, payload: Any, *, event_id: str | None = None) -> str:
     elif hasattr(payload, "dict"):
         payload = payload.dict()
 
-    json_payload = json.dumps(payload, ensure_ascii=False, default=str)
+    json_payload = orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
     return format_sse(event, json_payload, event_id=event_id)
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Token-aware trimming of article text before it is sent to the LLM."""
+
+import re
+import logging
+from functools import lru_cache
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAX_TOKENS = 512
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Terms that mark sequence-function and aging content, plus point-mutation notation (e.g. "C273S")
+_RELEVANCE_RE = re.compile(
+    r"\b(?:(?i:mutat\w*|substitut\w*|delet\w*|insert\w*|truncat\w*|residues?|amino acids?|"
+    r"domains?|motifs?|sequence|lifespan|longevity|aging|ageing|senescen\w*|uniprot|ortholog\w*)"
+    r"|[ACDEFGHIKLMNPQRSTVWY]\d{1,4}[ACDEFGHIKLMNPQRSTVWY*])"
+)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tokenizer once. Returns None if tiktoken is unavailable."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text, falling back to ~4 characters per token without tiktoken."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _chunk_with_counts(text: str, max_tokens: int) -> List[Tuple[str, int]]:
+    """Group consecutive sentences into chunks of at most max_tokens (single long sentences excepted)."""
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence_tokens = count_tokens(sentence)
+        if current and current_tokens + sentence_tokens > max_tokens:
+            chunks.append((" ".join(current), current_tokens))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += sentence_tokens
+    if current:
+        chunks.append((" ".join(current), current_tokens))
+    return chunks
+
+
+def select_relevant_chunks(text: str, token_budget: int) -> str:
+    """
+    Trim text to a token budget, keeping the most relevant chunks.
+
+    The first chunk (title/abstract) is always kept. Remaining chunks are ranked by
+    sequence-function/longevity term density, and the kept chunks are joined in
+    original document order so the result stays a stable, cacheable prefix.
+
+    Args:
+        text: Whitespace-normalized article text
+        token_budget: Maximum number of tokens to keep
+
+    Returns:
+        Original text if within budget, otherwise the selected chunks
+    """
+    if count_tokens(text) <= token_budget:
+        return text
+
+    chunks = _chunk_with_counts(text, CHUNK_MAX_TOKENS)
+    scores = [len(_RELEVANCE_RE.findall(chunk)) for chunk, _ in chunks]
+
+    keep = {0}
+    used = chunks[0][1]
+    for i in sorted(range(1, len(chunks)), key=lambda i: scores[i], reverse=True):
+        if used + chunks[i][1] <= token_budget:
+            keep.add(i)
+            used += chunks[i][1]
+
+    logger.info(f"Trimmed article text to {len(keep)} of {len(chunks)} chunks (~{used} tokens)")
+    return " ".join(chunks[i][0] for i in sorted(keep))
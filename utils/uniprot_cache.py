@@ -0,0 +1,77 @@
+"""Persistent gene -> UniProt ID cache stored in SQLite."""
+
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from typing import Optional
+
+from utils.sqlite_utils import SQLITE_DB_PATH, get_db_path
+
+logger = logging.getLogger(__name__)
+
+# UniProt accessions for a gene symbol practically never change
+UNIPROT_CACHE_TTL = 30 * 24 * 3600
+UNIPROT_CACHE_DB = "uniprot_cache.db"
+
+# In-process LRU layer in front of SQLite; holds found IDs only
+UNIPROT_MEMORY_CACHE_SIZE = 4096
+_memory_cache: OrderedDict[str, str] = OrderedDict()
+# Lookups run in worker threads
+_memory_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the cache database, creating it on first use."""
+    SQLITE_DB_PATH.mkdir(exist_ok=True)
+    conn = sqlite3.connect(get_db_path(UNIPROT_CACHE_DB))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS uniprot_ids ("
+        "gene TEXT PRIMARY KEY, uniprot_id TEXT NOT NULL, fetched_at REAL NOT NULL)"
+    )
+    return conn
+
+
+def _remember(gene: str, uniprot_id: str) -> None:
+    """Add an ID to the in-process layer, evicting the least recently used entry when full."""
+    with _memory_lock:
+        _memory_cache[gene] = uniprot_id
+        _memory_cache.move_to_end(gene)
+        if len(_memory_cache) > UNIPROT_MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def get_cached_uniprot_id(gene: str) -> Optional[str]:
+    """Return the cached UniProt ID for a normalized gene symbol, or None if missing/expired."""
+    with _memory_lock:
+        if gene in _memory_cache:
+            _memory_cache.move_to_end(gene)
+            return _memory_cache[gene]
+    try:
+        with closing(_connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT uniprot_id FROM uniprot_ids WHERE gene = ? AND fetched_at > ?",
+                (gene, time.time() - UNIPROT_CACHE_TTL),
+            ).fetchone()
+        if row is None:
+            return None
+        _remember(gene, row[0])
+        return row[0]
+    except sqlite3.Error as e:
+        logger.warning(f"UniProt cache read failed for {gene}: {str(e)}")
+        return None
+
+
+def cache_uniprot_id(gene: str, uniprot_id: str) -> None:
+    """Store the UniProt ID for a normalized gene symbol."""
+    _remember(gene, uniprot_id)
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uniprot_ids (gene, uniprot_id, fetched_at) VALUES (?, ?, ?)",
+                (gene, uniprot_id, time.time()),
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"UniProt cache write failed for {gene}: {str(e)}")